@@ -1,13 +1,19 @@
 #!/usr/bin/env python3
 
 import asyncio
+import bisect
 import difflib
+import errno
+import fnmatch
+import functools
 import json
 import os
+import re
 import shutil
+import stat
 import sys
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, List, Optional
 
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
@@ -75,7 +81,10 @@ class MoveFileArgs(BaseModel):
 class SearchFilesArgs(BaseModel):
     path: str
     pattern: str
-    excludePatterns: List[str] = Field(default_factory=list)
+    excludePatterns: List[str] = Field(
+        default_factory=list,
+        description="Glob patterns to exclude, matched against names and relative paths",
+    )
 
 
 class GetFileInfoArgs(BaseModel):
@@ -109,138 +118,241 @@ def expand_home(filepath: str) -> str:
     return filepath
 
 
+@functools.cache
+def _resolve_allowed_dirs(dirs: tuple[str, ...]) -> tuple[str, ...]:
+    """Resolve allowed directories once into sorted, separator-terminated prefixes.
+
+    Directories nested inside another allowed directory are dropped, so no
+    prefix is a prefix of another and a bisect finds the only candidate.
+    """
+    prefixes: List[str] = []
+    for prefix in sorted(
+        {
+            normalize_path(os.path.realpath(dir_path)).rstrip(os.sep) + os.sep
+            for dir_path in dirs
+        }
+    ):
+        if not prefixes or not prefix.startswith(prefixes[-1]):
+            prefixes.append(prefix)
+    return tuple(prefixes)
+
+
+def _is_path_allowed(path: str) -> bool:
+    """Check whether a normalized real path lies within an allowed directory."""
+    prefixes = _resolve_allowed_dirs(tuple(allowed_directories))
+    # The trailing separator keeps /foo from matching /foobar
+    candidate = path.rstrip(os.sep) + os.sep
+    # The only prefix that can contain the candidate is the last one sorting
+    # at or before it
+    i = bisect.bisect_right(prefixes, candidate) - 1
+    return i >= 0 and candidate.startswith(prefixes[i])
+
+
 async def validate_path(requested_path: str) -> str:
     """Validate that a path is within allowed directories."""
-    expanded_path = expand_home(requested_path)
-    absolute = os.path.abspath(expanded_path)
-    normalized_requested = normalize_path(absolute)
+    # Validation is all blocking syscalls, so keep it off the event loop
+    return await asyncio.to_thread(_validate_path_sync, requested_path)
 
-    # Normalize allowed directories to their real paths for consistent comparison
-    normalized_allowed_dirs = [
-        normalize_path(os.path.realpath(dir_path)) for dir_path in allowed_directories
-    ]
 
-    # Check if path is within allowed directories
-    # For symlinks, we need to check the symlink path itself first, not its target
-    if os.path.islink(absolute):
-        # For symlinks, get the real path of the symlink location (not target)
-        symlink_parent = os.path.dirname(absolute)
-        try:
-            real_symlink_parent = os.path.realpath(symlink_parent)
-            real_symlink_path = os.path.join(
-                real_symlink_parent, os.path.basename(absolute)
-            )
-            normalized_symlink = normalize_path(real_symlink_path)
-        except OSError:
-            normalized_symlink = normalized_requested
+def _validate_path_sync(requested_path: str) -> str:
+    """Validate a path synchronously; see validate_path."""
+    expanded_path = expand_home(requested_path)
+    absolute = os.path.abspath(expanded_path)
 
-        # Check if the symlink itself is in an allowed directory
-        is_symlink_allowed = any(
-            normalized_symlink.startswith(dir_path)
-            for dir_path in normalized_allowed_dirs
-        )
-        if not is_symlink_allowed:
-            raise ValueError(
-                f"Access denied - path outside allowed directories: {absolute} not in {', '.join(allowed_directories)}"
-            )
-    else:
-        # For non-symlinks, get the real path for comparison
-        try:
-            real_requested_path = os.path.realpath(absolute)
-            normalized_real_requested = normalize_path(real_requested_path)
-        except OSError:
-            # If we can't get the real path, use the normalized absolute path
-            normalized_real_requested = normalized_requested
+    # A single lstat tells us whether the path exists and whether it is a symlink
+    try:
+        st: Optional[os.stat_result] = os.lstat(absolute)
+    except OSError:
+        st = None
+    is_symlink = st is not None and stat.S_ISLNK(st.st_mode)
 
-        # Check if the path is within allowed directories
-        is_path_allowed = any(
-            normalized_real_requested.startswith(dir_path)
-            for dir_path in normalized_allowed_dirs
+    # Unless the final component is itself a symlink, the real path is the
+    # parent's real path joined with the base name, so only the parent needs
+    # resolving. For symlinks this is the location of the link, not its target.
+    parent_dir = os.path.dirname(absolute)
+    # Always resolve afresh: a cached answer would miss ancestors swapped for
+    # symlinks after an earlier validation
+    real_parent = os.path.realpath(parent_dir)
+    real_location = os.path.join(real_parent, os.path.basename(absolute))
+
+    # If the path isn't even in an allowed directory, reject immediately
+    if not _is_path_allowed(normalize_path(real_location)):
+        raise ValueError(
+            f"Access denied - path outside allowed directories: {absolute} not in {', '.join(allowed_directories)}"
         )
 
-        # If the path isn't even in an allowed directory, reject immediately
-        if not is_path_allowed:
-            raise ValueError(
-                f"Access denied - path outside allowed directories: {absolute} not in {', '.join(allowed_directories)}"
-            )
-
-    # For nonexistent files, check that the parent directory exists
-    if not os.path.exists(absolute):
-        parent_dir = os.path.dirname(absolute)
-        if not os.path.exists(parent_dir):
-            raise ValueError(f"Parent directory does not exist: {parent_dir}")
-
     # Handle symlinks by checking their real path
-    if os.path.islink(absolute):
+    if is_symlink:
         try:
             real_path = os.path.realpath(absolute)
-            normalized_real = normalize_path(real_path)
-            is_real_path_allowed = any(
-                normalized_real.startswith(dir_path)
-                for dir_path in normalized_allowed_dirs
-            )
-            if not is_real_path_allowed:
-                raise ValueError(
-                    "Access denied - symlink target outside allowed directories"
-                )
-            return real_path
         except OSError:
             raise ValueError("Access denied - could not resolve symlink")
+        if not _is_path_allowed(normalize_path(real_path)):
+            raise ValueError(
+                "Access denied - symlink target outside allowed directories"
+            )
+        return real_path
 
-    # For regular files that exist, resolve their real path
-    if os.path.exists(absolute):
-        try:
-            real_path = os.path.realpath(absolute)
-            return real_path
-        except OSError:
-            return absolute
-
-    # For nonexistent files, handle parent directory validation
-    # For new files that don't exist yet, verify parent directory
-    parent_dir = os.path.dirname(absolute)
-
-    # Check if parent directory actually exists
-    if not os.path.exists(parent_dir):
-        raise ValueError(f"Parent directory does not exist: {parent_dir}")
+    # For regular files that exist, the resolved location is the real path
+    if st is not None:
+        return real_location
 
+    # For nonexistent files, check that the parent directory exists. The
+    # resolved parent contains no symlinks, so lstat is enough.
     try:
-        real_parent_path = os.path.realpath(parent_dir)
-        normalized_parent = normalize_path(real_parent_path)
-        is_parent_allowed = any(
-            normalized_parent.startswith(dir_path)
-            for dir_path in normalized_allowed_dirs
-        )
-        if not is_parent_allowed:
-            raise ValueError(
-                "Access denied - parent directory outside allowed directories"
-            )
-        return absolute
+        os.lstat(real_parent)
     except OSError:
         raise ValueError(f"Parent directory does not exist: {parent_dir}")
 
+    return absolute
+
 
 def normalize_line_endings(text: str) -> str:
     """Normalize line endings to LF."""
+    # Avoid copying the text when there is nothing to replace
+    if "\r" not in text:
+        return text
     return text.replace("\r\n", "\n")
 
 
+# Context lines around each hunk, as in difflib.unified_diff
+_DIFF_CONTEXT = 3
+
+_NO_NEWLINE_MARKER = "\n\\ No newline at end of file"
+
+
+def _format_hunk_range(start: int, stop: int) -> str:
+    """Format a hunk's line range the way difflib.unified_diff does."""
+    length = stop - start
+    if length == 1:
+        return str(start + 1)
+    # An empty range names the line before it
+    return f"{start + 1 if length else start},{length}"
+
+
 def create_unified_diff(
     original_content: str, new_content: str, filepath: str = "file"
 ) -> str:
     """Create a unified diff between two strings."""
-    normalized_original = normalize_line_endings(original_content)
-    normalized_new = normalize_line_endings(new_content)
-
-    diff = difflib.unified_diff(
-        normalized_original.splitlines(keepends=True),
-        normalized_new.splitlines(keepends=True),
-        fromfile=f"{filepath} (original)",
-        tofile=f"{filepath} (modified)",
-        lineterm="",
+    if original_content == new_content:
+        return ""
+
+    original_text = normalize_line_endings(original_content)
+    new_text = normalize_line_endings(new_content)
+    original_lines = original_text.splitlines()
+    new_lines = new_text.splitlines()
+
+    # Carry a missing final newline on the last line itself, so a change to
+    # it alone still differs and is reported the way diff(1) does
+    for text, lines in ((original_text, original_lines), (new_text, new_lines)):
+        if lines and not text.endswith("\n"):
+            lines[-1] += _NO_NEWLINE_MARKER
+
+    # Edits touch a small region, so skip the common leading and trailing
+    # lines and only run difflib on the lines that differ
+    limit = min(len(original_lines), len(new_lines))
+    prefix = 0
+    while prefix < limit and original_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < limit - prefix
+        and original_lines[-1 - suffix] == new_lines[-1 - suffix]
+    ):
+        suffix += 1
+
+    original_end = len(original_lines) - suffix
+    new_end = len(new_lines) - suffix
+    if original_end == prefix and new_end == prefix:
+        # Only the line endings differed
+        return ""
+
+    # Group the changes into hunks as difflib.unified_diff does. Context
+    # lines are taken from the full lists, so a hunk is never cut short at
+    # the edge of the differing region.
+    context = _DIFF_CONTEXT
+    start = max(0, prefix - context)
+    hunks = [[("equal", start, prefix, start, prefix)]]
+    matcher = difflib.SequenceMatcher(
+        None, original_lines[prefix:original_end], new_lines[prefix:new_end]
+    )
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        i1, i2, j1, j2 = i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix
+        if tag == "equal" and i2 - i1 > 2 * context:
+            # A long unchanged run ends one hunk and starts the next
+            hunks[-1].append((tag, i1, i1 + context, j1, j1 + context))
+            hunks.append([(tag, i2 - context, i2, j2 - context, j2)])
+        else:
+            hunks[-1].append((tag, i1, i2, j1, j2))
+    trailing = min(suffix, context)
+    hunks[-1].append(
+        ("equal", original_end, original_end + trailing, new_end, new_end + trailing)
     )
+
+    # Lines are split without endings and terminated here, header lines too
+    diff = [f"--- {filepath} (original)\n", f"+++ {filepath} (modified)\n"]
+    for hunk in hunks:
+        diff.append(
+            f"@@ -{_format_hunk_range(hunk[0][1], hunk[-1][2])} "
+            f"+{_format_hunk_range(hunk[0][3], hunk[-1][4])} @@\n"
+        )
+        for op, i1, i2, j1, j2 in hunk:
+            if op == "equal":
+                diff.extend(f" {line}\n" for line in original_lines[i1:i2])
+                continue
+            if op != "insert":
+                diff.extend(f"-{line}\n" for line in original_lines[i1:i2])
+            if op != "delete":
+                diff.extend(f"+{line}\n" for line in new_lines[j1:j2])
     return "".join(diff)
 
 
+# Rabin-Karp parameters for matching blocks of lines
+_LINE_HASH_BASE = 1_000_003
+_LINE_HASH_MOD = (1 << 61) - 1
+
+
+def find_line_block(lines: List[str], block: List[str]) -> int:
+    """Find the first index where block matches lines, ignoring surrounding whitespace.
+
+    Uses a rolling hash over the stripped lines so the search is linear in the
+    number of lines rather than proportional to lines * block length.
+    """
+    block_size = len(block)
+    if block_size > len(lines):
+        return -1
+
+    stripped_block = [line.strip() for line in block]
+    stripped_lines = [line.strip() for line in lines]
+    line_hashes = [hash(line) % _LINE_HASH_MOD for line in stripped_lines]
+
+    target_hash = 0
+    window_hash = 0
+    for j in range(block_size):
+        target_hash = (
+            target_hash * _LINE_HASH_BASE + hash(stripped_block[j])
+        ) % _LINE_HASH_MOD
+        window_hash = (window_hash * _LINE_HASH_BASE + line_hashes[j]) % _LINE_HASH_MOD
+
+    # Weight of the line leaving the window
+    leading_weight = pow(_LINE_HASH_BASE, block_size - 1, _LINE_HASH_MOD)
+
+    for i in range(len(lines) - block_size + 1):
+        # Verify on a hash hit to rule out collisions
+        if (
+            window_hash == target_hash
+            and stripped_lines[i : i + block_size] == stripped_block
+        ):
+            return i
+        if i + block_size < len(lines):
+            window_hash = (
+                (window_hash - line_hashes[i] * leading_weight) * _LINE_HASH_BASE
+                + line_hashes[i + block_size]
+            ) % _LINE_HASH_MOD
+
+    return -1
+
+
 async def apply_file_edits(
     file_path: str, edits: List[EditOperation], dry_run: bool = False
 ) -> str:
@@ -249,12 +361,19 @@ async def apply_file_edits(
     with open(file_path, "r", encoding="utf-8") as f:
         content = normalize_line_endings(f.read())
 
+    # Normalize every edit up front so the loop only works on LF text
+    normalized_edits = [
+        (
+            edit.oldText,
+            normalize_line_endings(edit.oldText),
+            normalize_line_endings(edit.newText),
+        )
+        for edit in edits
+    ]
+
     # Apply edits sequentially
     modified_content = content
-    for edit in edits:
-        normalized_old = normalize_line_endings(edit.oldText)
-        normalized_new = normalize_line_endings(edit.newText)
-
+    for old_text, normalized_old, normalized_new in normalized_edits:
         # If exact match exists, use it
         if normalized_old in modified_content:
             modified_content = modified_content.replace(normalized_old, normalized_new)
@@ -263,50 +382,38 @@ async def apply_file_edits(
         # Otherwise, try line-by-line matching with flexibility for whitespace
         old_lines = normalized_old.split("\n")
         content_lines = modified_content.split("\n")
-        match_found = False
-
-        for i in range(len(content_lines) - len(old_lines) + 1):
-            potential_match = content_lines[i : i + len(old_lines)]
-
-            # Compare lines with normalized whitespace
-            is_match = all(
-                old_line.strip() == content_line.strip()
-                for old_line, content_line in zip(old_lines, potential_match)
-            )
-
-            if is_match:
-                # Preserve original indentation of first line
-                original_indent = content_lines[i][
-                    : len(content_lines[i]) - len(content_lines[i].lstrip())
-                ]
-                new_lines = normalized_new.split("\n")
-
-                if new_lines:
-                    new_lines[0] = original_indent + new_lines[0].lstrip()
-                    # For subsequent lines, preserve relative indentation
-                    for j in range(1, len(new_lines)):
-                        if j < len(old_lines):
-                            old_indent = old_lines[j][
-                                : len(old_lines[j]) - len(old_lines[j].lstrip())
-                            ]
-                            new_indent = new_lines[j][
-                                : len(new_lines[j]) - len(new_lines[j].lstrip())
-                            ]
-                            if old_indent and new_indent:
-                                relative_indent = len(new_indent) - len(old_indent)
-                                new_lines[j] = (
-                                    original_indent
-                                    + " " * max(0, relative_indent)
-                                    + new_lines[j].lstrip()
-                                )
-
-                content_lines[i : i + len(old_lines)] = new_lines
-                modified_content = "\n".join(content_lines)
-                match_found = True
-                break
-
-        if not match_found:
-            raise ValueError(f"Could not find exact match for edit:\n{edit.oldText}")
+        i = find_line_block(content_lines, old_lines)
+
+        if i == -1:
+            raise ValueError(f"Could not find exact match for edit:\n{old_text}")
+
+        # Preserve original indentation of first line
+        original_indent = content_lines[i][
+            : len(content_lines[i]) - len(content_lines[i].lstrip())
+        ]
+        new_lines = normalized_new.split("\n")
+
+        if new_lines:
+            new_lines[0] = original_indent + new_lines[0].lstrip()
+            # For subsequent lines, preserve relative indentation
+            for j in range(1, len(new_lines)):
+                if j < len(old_lines):
+                    old_indent = old_lines[j][
+                        : len(old_lines[j]) - len(old_lines[j].lstrip())
+                    ]
+                    new_indent = new_lines[j][
+                        : len(new_lines[j]) - len(new_lines[j].lstrip())
+                    ]
+                    if old_indent and new_indent:
+                        relative_indent = len(new_indent) - len(old_indent)
+                        new_lines[j] = (
+                            original_indent
+                            + " " * max(0, relative_indent)
+                            + new_lines[j].lstrip()
+                        )
+
+        content_lines[i : i + len(old_lines)] = new_lines
+        modified_content = "\n".join(content_lines)
 
     # Create unified diff
     diff = create_unified_diff(content, modified_content, file_path)
@@ -321,67 +428,127 @@ async def apply_file_edits(
     return formatted_diff
 
 
+_SIZE_UNITS = ("B", "KB", "MB", "GB", "TB")
+_SIZE_DIVISORS = tuple(1024**i for i in range(len(_SIZE_UNITS)))
+
+
 def format_size(bytes_count: int) -> str:
     """Format file size in human readable format."""
-    units = ["B", "KB", "MB", "GB", "TB"]
     if bytes_count == 0:
         return "0 B"
 
-    i = min(len(units) - 1, int(len(f"{bytes_count:b}") / 10))
+    # bit_length() // 10 approximates log base 1024 without formatting the number
+    i = min(len(_SIZE_UNITS) - 1, bytes_count.bit_length() // 10)
     if i == 0:
-        return f"{bytes_count} {units[i]}"
+        return f"{bytes_count} {_SIZE_UNITS[i]}"
 
-    return f"{bytes_count / (1024**i):.2f} {units[i]}"
+    return f"{bytes_count / _SIZE_DIVISORS[i]:.2f} {_SIZE_UNITS[i]}"
 
 
 async def tail_file(file_path: str, num_lines: int) -> str:
     """Get the last N lines of a file efficiently."""
-    with open(file_path, "rb") as f:
-        # Go to end of file
-        f.seek(0, 2)
-        file_size = f.tell()
+    if num_lines <= 0:
+        return ""
+
+    # Read large blocks backwards from the end until enough newlines have
+    # been seen. Unlike an mmap, pread on a file truncated meanwhile (as by
+    # copytruncate log rotation) returns short rather than raising SIGBUS.
+    chunks: List[bytes] = []
+    newlines_found = 0
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        position = os.fstat(fd).st_size
+        while position > 0 and newlines_found < num_lines:
+            size = min(64 * 1024, position)
+            position -= size
+            chunk = os.pread(fd, size, position)
+            chunks.append(chunk)
+            newlines_found += chunk.count(b"\n")
+    finally:
+        os.close(fd)
+
+    data = b"".join(reversed(chunks))
+
+    # Walk back from the end to the newline preceding the last N lines
+    start = len(data)
+    for _ in range(num_lines):
+        start = data.rfind(b"\n", 0, start)
+        if start == -1:
+            break
+
+    # Decode once so multibyte characters are never split across reads
+    tail = data[start + 1 :].decode("utf-8", errors="ignore")
+    return normalize_line_endings(tail)
 
-        if file_size == 0:
-            return ""
 
-        # Read chunks from the end
-        chunk_size = 1024
-        lines: List[str] = []
-        lines_found = 0
-        position = file_size
+async def head_file(file_path: str, num_lines: int) -> str:
+    """Get the first N lines of a file efficiently."""
+    if num_lines <= 0:
+        return ""
 
-        while position > 0 and lines_found < num_lines:
-            chunk_size = min(chunk_size, position)
-            position -= chunk_size
-            f.seek(position)
+    # Read large blocks until enough newlines have been seen, then decode once
+    chunks: List[bytes] = []
+    newlines_found = 0
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        while newlines_found < num_lines:
+            chunk = os.read(fd, 64 * 1024)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            newlines_found += chunk.count(b"\n")
+    finally:
+        os.close(fd)
+
+    data = b"".join(chunks)
+    if newlines_found >= num_lines:
+        # Drop the partial line after the last newline so a multibyte
+        # character cut off by the block boundary is never decoded
+        data = data[: data.rindex(b"\n") + 1]
+
+    # Match text-mode universal newlines, where a lone CR also ends a line
+    text = translate_newlines(data.decode("utf-8"))
+    lines = text.split("\n", num_lines)
+    if len(lines) > num_lines:
+        lines = lines[:num_lines]
+    elif lines[-1] == "":
+        # Text ending in a newline leaves an empty piece that is not a line
+        lines.pop()
 
-            chunk = f.read(chunk_size).decode("utf-8", errors="ignore")
-            chunk_lines = normalize_line_endings(chunk).split("\n")
+    return "\n".join(lines)
 
-            # If not at beginning of file, first line might be incomplete
-            if position > 0:
-                chunk_lines = chunk_lines[1:]
 
-            # Add lines from end
-            for line in reversed(chunk_lines):
-                if lines_found < num_lines:
-                    lines.insert(0, line)
-                    lines_found += 1
+def translate_newlines(text: str) -> str:
+    """Translate CRLF and lone CR line endings to LF, as text-mode reads do."""
+    if "\r" not in text:
+        return text
+    return text.replace("\r\n", "\n").replace("\r", "\n")
 
-        return "\n".join(lines[:num_lines])
 
+def read_text_file(file_path: str) -> str:
+    """Read the complete contents of a UTF-8 text file."""
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        file_stat = os.fstat(fd)
+        if stat.S_ISDIR(file_stat.st_mode):
+            raise IsADirectoryError(errno.EISDIR, os.strerror(errno.EISDIR), file_path)
 
-async def head_file(file_path: str, num_lines: int) -> str:
-    """Get the first N lines of a file efficiently."""
-    lines = []
-    with open(file_path, "r", encoding="utf-8") as f:
-        for _ in range(num_lines):
-            line = f.readline()
-            if not line:
-                break
-            lines.append(line.rstrip("\n\r"))
+        # Read the whole file in one call sized from fstat, falling back to
+        # further reads for files whose size is not known up front
+        chunks = [os.read(fd, max(file_stat.st_size, 64 * 1024))]
+        while chunks[-1]:
+            chunks.append(os.read(fd, 64 * 1024))
+    finally:
+        os.close(fd)
 
-    return "\n".join(lines)
+    # Decode in one pass instead of through an incremental text decoder
+    return translate_newlines(b"".join(chunks).decode("utf-8"))
+
+
+def scan_directory(dir_path: str) -> List[os.DirEntry[str]]:
+    """List the entries of a directory in a single scandir pass."""
+    with os.scandir(dir_path) as it:
+        return list(it)
 
 
 async def get_file_stats(file_path: str) -> FileInfo:
@@ -402,38 +569,66 @@ async def search_files(
     root_path: str, pattern: str, exclude_patterns: Optional[List[str]] = None
 ) -> List[str]:
     """Recursively search for files matching a pattern."""
-    if exclude_patterns is None:
-        exclude_patterns = []
+    # The walk is all blocking syscalls, so keep it off the event loop
+    return await asyncio.to_thread(_search_files, root_path, pattern, exclude_patterns)
+
+
+def _search_files(
+    root_path: str, pattern: str, exclude_patterns: Optional[List[str]]
+) -> List[str]:
+    """Search for files synchronously; see search_files."""
+    pattern_lower = pattern.lower()
+
+    # Compile all exclude globs into one regex, matched against both the
+    # entry name and its path relative to the search root
+    exclude_regex = (
+        re.compile("|".join(fnmatch.translate(p) for p in exclude_patterns))
+        if exclude_patterns
+        else None
+    )
 
     results = []
 
-    for root, dirs, files in os.walk(root_path):
+    # Iterative depth-first walk. Only real subdirectories are pushed, so
+    # everything visited lies inside the already validated root.
+    stack = [root_path]
+    while stack:
+        current_path = stack.pop()
+        relative_root = current_path[len(root_path) :].lstrip(os.sep)
+
         try:
-            await validate_path(root)
-        except ValueError:
+            dir_iterator = os.scandir(current_path)
+        except OSError:
             continue
 
-        # Check directories and files
-        for name in dirs + files:
-            full_path = os.path.join(root, name)
+        subdirs = []
+        with dir_iterator:
+            for entry in dir_iterator:
+                name = entry.name
 
-            try:
-                await validate_path(full_path)
-            except ValueError:
-                continue
+                # Only symlinks can point outside an allowed directory
+                if entry.is_symlink():
+                    try:
+                        _validate_path_sync(entry.path)
+                    except ValueError:
+                        continue
 
-            # Check exclude patterns
-            relative_path = os.path.relpath(full_path, root_path)
-            should_exclude = any(
-                pattern in relative_path or name in pattern
-                for pattern in exclude_patterns
-            )
+                # Check exclude patterns
+                if exclude_regex is not None and (
+                    exclude_regex.match(name)
+                    or exclude_regex.match(os.path.join(relative_root, name))
+                ):
+                    continue
 
-            if should_exclude:
-                continue
+                # Symlinked directories can match but are never descended into
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
 
-            if pattern.lower() in name.lower():
-                results.append(full_path)
+                if pattern_lower in name.lower():
+                    results.append(entry.path)
+
+        # Push in reverse so subdirectories are visited in listing order
+        stack.extend(reversed(subdirs))
 
     return results
 
@@ -442,131 +637,135 @@ async def search_files(
 server: Server = Server("secure-filesystem-server")  # type: ignore[type-arg]
 
 
-@server.list_tools()  # type: ignore[misc,no-untyped-call]
-async def list_tools() -> list[Tool]:
-    """List available tools."""
-    return [
-        Tool(
-            name="read_file",
-            description=(
-                "Read the complete contents of a file from the file system. "
-                "Handles various text encodings and provides detailed error messages "
-                "if the file cannot be read. Use this tool when you need to examine "
-                "the contents of a single file. Use the 'head' parameter to read only "
-                "the first N lines of a file, or the 'tail' parameter to read only "
-                "the last N lines of a file. Only works within allowed directories."
-            ),
-            inputSchema=ReadFileArgs.model_json_schema(),
+# Tool definitions with their JSON schemas, generated once at import
+_TOOLS: tuple[Tool, ...] = (
+    Tool(
+        name="read_file",
+        description=(
+            "Read the complete contents of a file from the file system. "
+            "Handles various text encodings and provides detailed error messages "
+            "if the file cannot be read. Use this tool when you need to examine "
+            "the contents of a single file. Use the 'head' parameter to read only "
+            "the first N lines of a file, or the 'tail' parameter to read only "
+            "the last N lines of a file. Only works within allowed directories."
         ),
-        Tool(
-            name="read_multiple_files",
-            description=(
-                "Read the contents of multiple files simultaneously. This is more "
-                "efficient than reading files one by one when you need to analyze "
-                "or compare multiple files. Each file's content is returned with its "
-                "path as a reference. Failed reads for individual files won't stop "
-                "the entire operation. Only works within allowed directories."
-            ),
-            inputSchema=ReadMultipleFilesArgs.model_json_schema(),
+        inputSchema=ReadFileArgs.model_json_schema(),
+    ),
+    Tool(
+        name="read_multiple_files",
+        description=(
+            "Read the contents of multiple files simultaneously. This is more "
+            "efficient than reading files one by one when you need to analyze "
+            "or compare multiple files. Each file's content is returned with its "
+            "path as a reference. Failed reads for individual files won't stop "
+            "the entire operation. Only works within allowed directories."
         ),
-        Tool(
-            name="write_file",
-            description=(
-                "Create a new file or completely overwrite an existing file with new content. "
-                "Use with caution as it will overwrite existing files without warning. "
-                "Handles text content with proper encoding. Only works within allowed directories."
-            ),
-            inputSchema=WriteFileArgs.model_json_schema(),
+        inputSchema=ReadMultipleFilesArgs.model_json_schema(),
+    ),
+    Tool(
+        name="write_file",
+        description=(
+            "Create a new file or completely overwrite an existing file with new content. "
+            "Use with caution as it will overwrite existing files without warning. "
+            "Handles text content with proper encoding. Only works within allowed directories."
         ),
-        Tool(
-            name="edit_file",
-            description=(
-                "Make line-based edits to a text file. Each edit replaces exact line sequences "
-                "with new content. Returns a git-style diff showing the changes made. "
-                "Only works within allowed directories."
-            ),
-            inputSchema=EditFileArgs.model_json_schema(),
+        inputSchema=WriteFileArgs.model_json_schema(),
+    ),
+    Tool(
+        name="edit_file",
+        description=(
+            "Make line-based edits to a text file. Each edit replaces exact line sequences "
+            "with new content. Returns a git-style diff showing the changes made. "
+            "Only works within allowed directories."
         ),
-        Tool(
-            name="create_directory",
-            description=(
-                "Create a new directory or ensure a directory exists. Can create multiple "
-                "nested directories in one operation. If the directory already exists, "
-                "this operation will succeed silently. Perfect for setting up directory "
-                "structures for projects or ensuring required paths exist. Only works within allowed directories."
-            ),
-            inputSchema=CreateDirectoryArgs.model_json_schema(),
+        inputSchema=EditFileArgs.model_json_schema(),
+    ),
+    Tool(
+        name="create_directory",
+        description=(
+            "Create a new directory or ensure a directory exists. Can create multiple "
+            "nested directories in one operation. If the directory already exists, "
+            "this operation will succeed silently. Perfect for setting up directory "
+            "structures for projects or ensuring required paths exist. Only works within allowed directories."
         ),
-        Tool(
-            name="list_directory",
-            description=(
-                "Get a detailed listing of all files and directories in a specified path. "
-                "Results clearly distinguish between files and directories with [FILE] and [DIR] "
-                "prefixes. This tool is essential for understanding directory structure and "
-                "finding specific files within a directory. Only works within allowed directories."
-            ),
-            inputSchema=ListDirectoryArgs.model_json_schema(),
+        inputSchema=CreateDirectoryArgs.model_json_schema(),
+    ),
+    Tool(
+        name="list_directory",
+        description=(
+            "Get a detailed listing of all files and directories in a specified path. "
+            "Results clearly distinguish between files and directories with [FILE] and [DIR] "
+            "prefixes. This tool is essential for understanding directory structure and "
+            "finding specific files within a directory. Only works within allowed directories."
         ),
-        Tool(
-            name="list_directory_with_sizes",
-            description=(
-                "Get a detailed listing of all files and directories in a specified path, including sizes. "
-                "Results clearly distinguish between files and directories with [FILE] and [DIR] "
-                "prefixes. This tool is useful for understanding directory structure and "
-                "finding specific files within a directory. Only works within allowed directories."
-            ),
-            inputSchema=ListDirectoryWithSizesArgs.model_json_schema(),
+        inputSchema=ListDirectoryArgs.model_json_schema(),
+    ),
+    Tool(
+        name="list_directory_with_sizes",
+        description=(
+            "Get a detailed listing of all files and directories in a specified path, including sizes. "
+            "Results clearly distinguish between files and directories with [FILE] and [DIR] "
+            "prefixes. This tool is useful for understanding directory structure and "
+            "finding specific files within a directory. Only works within allowed directories."
         ),
-        Tool(
-            name="directory_tree",
-            description=(
-                "Get a recursive tree view of files and directories as a JSON structure. "
-                "Each entry includes 'name', 'type' (file/directory), and 'children' for directories. "
-                "Files have no children array, while directories always have a children array (which may be empty). "
-                "The output is formatted with 2-space indentation for readability. Only works within allowed directories."
-            ),
-            inputSchema=DirectoryTreeArgs.model_json_schema(),
+        inputSchema=ListDirectoryWithSizesArgs.model_json_schema(),
+    ),
+    Tool(
+        name="directory_tree",
+        description=(
+            "Get a recursive tree view of files and directories as a JSON structure. "
+            "Each entry includes 'name', 'type' (file/directory), and 'children' for directories. "
+            "Files have no children array, while directories always have a children array (which may be empty). "
+            "The output is formatted with 2-space indentation for readability. Only works within allowed directories."
         ),
-        Tool(
-            name="move_file",
-            description=(
-                "Move or rename files and directories. Can move files between directories "
-                "and rename them in a single operation. If the destination exists, the "
-                "operation will fail. Works across different directories and can be used "
-                "for simple renaming within the same directory. Both source and destination must be within allowed directories."
-            ),
-            inputSchema=MoveFileArgs.model_json_schema(),
+        inputSchema=DirectoryTreeArgs.model_json_schema(),
+    ),
+    Tool(
+        name="move_file",
+        description=(
+            "Move or rename files and directories. Can move files between directories "
+            "and rename them in a single operation. If the destination exists, the "
+            "operation will fail. Works across different directories and can be used "
+            "for simple renaming within the same directory. Both source and destination must be within allowed directories."
         ),
-        Tool(
-            name="search_files",
-            description=(
-                "Recursively search for files and directories matching a pattern. "
-                "Searches through all subdirectories from the starting path. The search "
-                "is case-insensitive and matches partial names. Returns full paths to all "
-                "matching items. Great for finding files when you don't know their exact location. "
-                "Only searches within allowed directories."
-            ),
-            inputSchema=SearchFilesArgs.model_json_schema(),
+        inputSchema=MoveFileArgs.model_json_schema(),
+    ),
+    Tool(
+        name="search_files",
+        description=(
+            "Recursively search for files and directories matching a pattern. "
+            "Searches through all subdirectories from the starting path. The search "
+            "is case-insensitive and matches partial names. Returns full paths to all "
+            "matching items. Great for finding files when you don't know their exact location. "
+            "Only searches within allowed directories."
         ),
-        Tool(
-            name="get_file_info",
-            description=(
-                "Retrieve detailed metadata about a file or directory. Returns comprehensive "
-                "information including size, creation time, last modified time, permissions, "
-                "and type. This tool is perfect for understanding file characteristics "
-                "without reading the actual content. Only works within allowed directories."
-            ),
-            inputSchema=GetFileInfoArgs.model_json_schema(),
+        inputSchema=SearchFilesArgs.model_json_schema(),
+    ),
+    Tool(
+        name="get_file_info",
+        description=(
+            "Retrieve detailed metadata about a file or directory. Returns comprehensive "
+            "information including size, creation time, last modified time, permissions, "
+            "and type. This tool is perfect for understanding file characteristics "
+            "without reading the actual content. Only works within allowed directories."
         ),
-        Tool(
-            name="list_allowed_directories",
-            description=(
-                "Returns the list of directories that this server is allowed to access. "
-                "Use this to understand which directories are available before trying to access files."
-            ),
-            inputSchema={},
+        inputSchema=GetFileInfoArgs.model_json_schema(),
+    ),
+    Tool(
+        name="list_allowed_directories",
+        description=(
+            "Returns the list of directories that this server is allowed to access. "
+            "Use this to understand which directories are available before trying to access files."
         ),
-    ]
+        inputSchema={},
+    ),
+)
+
+
+@server.list_tools()  # type: ignore[misc,no-untyped-call]
+async def list_tools() -> list[Tool]:
+    """List available tools."""
+    return list(_TOOLS)
 
 
 @server.call_tool()  # type: ignore[misc,no-untyped-call]
@@ -588,23 +787,29 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
             elif read_args.head:
                 content = await head_file(valid_path, read_args.head)
             else:
-                with open(valid_path, "r", encoding="utf-8") as f:
-                    content = f.read()
+                content = await asyncio.to_thread(read_text_file, valid_path)
 
             return [TextContent(type="text", text=content)]
 
         elif name == "read_multiple_files":
             multi_read_args = ReadMultipleFilesArgs.model_validate(arguments)
-            results = []
 
-            for file_path in multi_read_args.paths:
-                try:
-                    valid_path = await validate_path(file_path)
-                    with open(valid_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-                    results.append(f"{file_path}:\n{content}\n")
-                except Exception as e:
-                    results.append(f"{file_path}: Error - {str(e)}")
+            async def read_one(file_path: str) -> str:
+                valid_path = await validate_path(file_path)
+                # Read in the thread pool so the files are read concurrently
+                content = await asyncio.to_thread(read_text_file, valid_path)
+                return f"{file_path}:\n{content}\n"
+
+            outcomes = await asyncio.gather(
+                *(read_one(file_path) for file_path in multi_read_args.paths),
+                return_exceptions=True,
+            )
+            results = [
+                outcome
+                if isinstance(outcome, str)
+                else f"{file_path}: Error - {str(outcome)}"
+                for file_path, outcome in zip(multi_read_args.paths, outcomes)
+            ]
 
             return [TextContent(type="text", text="\n---\n".join(results))]
 
@@ -648,12 +853,12 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
             valid_path = await validate_path(list_args.path)
 
             dir_entries = []
-            for entry in os.listdir(valid_path):
-                entry_path = os.path.join(valid_path, entry)
-                if os.path.isdir(entry_path):
-                    dir_entries.append(f"[DIR] {entry}")
-                else:
-                    dir_entries.append(f"[FILE] {entry}")
+            with os.scandir(valid_path) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        dir_entries.append(f"[DIR] {entry.name}")
+                    else:
+                        dir_entries.append(f"[FILE] {entry.name}")
 
             return [TextContent(type="text", text="\n".join(dir_entries))]
 
@@ -666,19 +871,28 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
             total_dirs = 0
             total_size = 0
 
-            for entry in os.listdir(valid_path):
-                entry_path = os.path.join(valid_path, entry)
-                try:
-                    stat = os.stat(entry_path)
-                    if os.path.isdir(entry_path):
-                        size_entries.append((entry, True, 0, stat.st_mtime))
-                        total_dirs += 1
-                    else:
-                        size_entries.append((entry, False, stat.st_size, stat.st_mtime))
-                        total_files += 1
-                        total_size += stat.st_size
-                except OSError:
-                    size_entries.append((entry, os.path.isdir(entry_path), 0, 0.0))
+            with os.scandir(valid_path) as it:
+                for entry in it:
+                    try:
+                        entry_stat = entry.stat()
+                        if entry.is_dir():
+                            size_entries.append(
+                                (entry.name, True, 0, entry_stat.st_mtime)
+                            )
+                            total_dirs += 1
+                        else:
+                            size_entries.append(
+                                (
+                                    entry.name,
+                                    False,
+                                    entry_stat.st_size,
+                                    entry_stat.st_mtime,
+                                )
+                            )
+                            total_files += 1
+                            total_size += entry_stat.st_size
+                    except OSError:
+                        size_entries.append((entry.name, entry.is_dir(), 0, 0.0))
 
             # Sort entries
             if sizes_args.sortBy == "size":
@@ -707,33 +921,98 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
         elif name == "directory_tree":
             tree_args = DirectoryTreeArgs.model_validate(arguments)
 
-            async def build_tree(current_path: str) -> List[Dict[str, Any]]:
-                valid_path = await validate_path(current_path)
-                result: List[Dict[str, Any]] = []
+            # Bound how many directories are read at once to avoid FD exhaustion
+            semaphore = asyncio.Semaphore(32)
 
-                for entry in os.listdir(valid_path):
-                    entry_path = os.path.join(current_path, entry)
-                    entry_data: Dict[str, Any] = {
-                        "name": entry,
-                        "type": "directory" if os.path.isdir(entry_path) else "file",
-                    }
+            # The tree is emitted directly as JSON text fragments, formatted
+            # exactly like json.dumps(..., indent=2), instead of building a
+            # dict per entry and serializing the whole structure afterwards
+            async def build_tree(
+                valid_path: str, indent: str, ancestors: frozenset[str]
+            ) -> List[str]:
+                async with semaphore:
+                    entries = await asyncio.to_thread(scan_directory, valid_path)
 
-                    if os.path.isdir(entry_path):
-                        entry_data["children"] = await build_tree(entry_path)
+                if not entries:
+                    return ["[]"]
 
-                    result.append(entry_data)
+                item_indent = indent + "  "
+                field_indent = item_indent + "  "
+                is_dirs = [entry.is_dir() for entry in entries]
+                ancestors = ancestors | {valid_path}
 
-                return result
-
-            tree_data = await build_tree(tree_args.path)
-            return [TextContent(type="text", text=json.dumps(tree_data, indent=2))]
+                # Walk all subdirectories of this level concurrently; the task
+                # group cancels the remaining walks as soon as one fails
+                try:
+                    async with asyncio.TaskGroup() as tg:
+                        tasks = [
+                            tg.create_task(
+                                build_subtree(entry, field_indent, ancestors)
+                            )
+                            for entry, is_dir in zip(entries, is_dirs)
+                            if is_dir
+                        ]
+                except ExceptionGroup as group:
+                    # Report the failure itself rather than the group wrapper
+                    raise group.exceptions[0]
+                subtrees = (task.result() for task in tasks)
+
+                parts = ["["]
+                for i, (entry, is_dir) in enumerate(zip(entries, is_dirs)):
+                    parts.append(
+                        f"{',' if i else ''}\n{item_indent}{{\n"
+                        f'{field_indent}"name": '
+                        f"{json.encoder.encode_basestring_ascii(entry.name)},\n"
+                        f'{field_indent}"type": '
+                    )
+                    if is_dir:
+                        parts.append(f'"directory",\n{field_indent}"children": ')
+                        parts.extend(next(subtrees))
+                    else:
+                        parts.append('"file"')
+                    parts.append(f"\n{item_indent}}}")
+                parts.append(f"\n{indent}]")
+
+                return parts
+
+            async def build_subtree(
+                entry: os.DirEntry[str], indent: str, ancestors: frozenset[str]
+            ) -> List[str]:
+                # Children of a validated directory are valid unless they are
+                # symlinks that may point elsewhere
+                if entry.is_symlink():
+                    real_path = await validate_path(entry.path)
+                else:
+                    real_path = entry.path
+                # Every path walked is fully resolved, so a symlink back to a
+                # directory already on this branch shows up as a repeated path;
+                # list it without children instead of looping forever
+                if real_path in ancestors:
+                    return ["[]"]
+                return await build_tree(real_path, indent, ancestors)
+
+            tree_parts = await build_tree(
+                await validate_path(tree_args.path), "", frozenset()
+            )
+            return [TextContent(type="text", text="".join(tree_parts))]
 
         elif name == "move_file":
             move_args = MoveFileArgs.model_validate(arguments)
-            valid_source = await validate_path(move_args.source)
-            valid_dest = await validate_path(move_args.destination)
+            # Validate both ends concurrently, but report the source first
+            source_result, dest_result = await asyncio.gather(
+                validate_path(move_args.source),
+                validate_path(move_args.destination),
+                return_exceptions=True,
+            )
+            if isinstance(source_result, BaseException):
+                raise source_result
+            if isinstance(dest_result, BaseException):
+                raise dest_result
+            valid_source, valid_dest = source_result, dest_result
 
-            shutil.move(valid_source, valid_dest)
+            # shutil.move renames when it can and otherwise copies through
+            # copyfile's sendfile fast path; either way keep it off the loop
+            await asyncio.to_thread(shutil.move, valid_source, valid_dest)
 
             return [
                 TextContent(
@@ -814,6 +1093,9 @@ async def main() -> None:
         normalized_dir = normalize_path(os.path.abspath(expanded_dir))
         allowed_directories.append(normalized_dir)
 
+    # Resolve the allowed directories once up front
+    _resolve_allowed_dirs(tuple(allowed_directories))
+
     print("Secure MCP Filesystem Server running on stdio", file=sys.stderr)
     print(f"Allowed directories: {allowed_directories}", file=sys.stderr)
 
@@ -1,9 +1,42 @@
 #!/usr/bin/env python3
 
+import functools
 import os
 import re
+import string
 
+# Process-wide invariants, resolved once at import
+_IS_WINDOWS = os.name == "nt"
+_HOME_DIR = os.path.expanduser("~")
+# What os.path.join(_HOME_DIR, rest) prepends to a relative rest
+_HOME_PREFIX = os.path.join(_HOME_DIR, "")
 
+# Drive letters are ASCII only; str.isalpha() would also accept "é" and friends
+_DRIVE_LETTERS = frozenset(string.ascii_letters)
+_BACKSLASH_RUN_RE = re.compile(r"\\{2,}")
+_QUOTES = ('"', "'")
+
+
+def _ascii_upper(c: str) -> str:
+    """Uppercase an ASCII letter without going through Unicode case mapping."""
+    return chr(ord(c) & 0x5F) if "a" <= c <= "z" else c
+
+
+def _strip_path(p: str) -> str:
+    """Strip surrounding whitespace, then any quotes it was wrapped in."""
+    p = p.strip()
+    # Most paths are unquoted, so only pay for the second strip when needed
+    if p[:1] in _QUOTES or p[-1:] in _QUOTES:
+        p = p.strip("\"'")
+    return p
+
+
+def _is_unix_drive_prefix(p: str) -> bool:
+    """Return True if p starts with a Unix-style drive prefix such as /c/."""
+    return len(p) >= 3 and p[0] == "/" and p[1] in _DRIVE_LETTERS and p[2] == "/"
+
+
+@functools.lru_cache(maxsize=4096)
 def convert_to_windows_path(p: str) -> str:
     """
     Converts WSL or Unix-style Windows paths to Windows format.
@@ -14,27 +47,34 @@ def convert_to_windows_path(p: str) -> str:
     Returns:
         Converted Windows path
     """
-    # Handle WSL paths (/mnt/c/...)
-    if p.startswith("/mnt/"):
-        if len(p) > 5:
-            drive_letter = p[5].upper()
-            path_part = p[6:].replace("/", "\\")
+    # Without forward slashes there is no prefix to convert and nothing to flip
+    if "/" not in p:
+        return p
+
+    first = p[:1]
+    if first == "/":
+        # Handle WSL paths (/mnt/c/...)
+        wsl_rest = p.removeprefix("/mnt/")
+        if wsl_rest and len(wsl_rest) < len(p):
+            drive_letter = _ascii_upper(wsl_rest[0])
+            path_part = wsl_rest[1:].replace("/", "\\")
             return f"{drive_letter}:{path_part}"
 
-    # Handle Unix-style Windows paths (/c/...)
-    if re.match(r"^/[a-zA-Z]/", p):
-        drive_letter = p[1].upper()
-        path_part = p[2:].replace("/", "\\")
-        return f"{drive_letter}:{path_part}"
+        # Handle Unix-style Windows paths (/c/...)
+        if p[2:3] == "/" and p[1] in _DRIVE_LETTERS:
+            drive_letter = _ascii_upper(p[1])
+            path_part = p[2:].replace("/", "\\")
+            return f"{drive_letter}:{path_part}"
 
     # Handle standard Windows paths, ensuring backslashes
-    if re.match(r"^[a-zA-Z]:", p):
+    elif p[1:2] == ":" and first in _DRIVE_LETTERS:
         return p.replace("/", "\\")
 
     # Leave non-Windows paths unchanged
     return p
 
 
+@functools.lru_cache(maxsize=4096)
 def normalize_path(p: str) -> str:
     """
     Normalizes path by standardizing format while preserving OS-specific behavior.
@@ -46,81 +86,102 @@ def normalize_path(p: str) -> str:
         Normalized path
     """
     # Remove any surrounding quotes and whitespace
-    p = p.strip().strip("\"'")
+    p = _strip_path(p)
 
     # Check if this is a Unix path (starts with / but not a Windows or WSL path)
     is_unix_path = (
         p.startswith("/")
-        and not re.match(r"^/mnt/[a-z]/", p, re.IGNORECASE)
-        and not re.match(r"^/[a-zA-Z]/", p)
+        and not (p.startswith("/mnt/") and _is_unix_drive_prefix(p[4:7]))
+        and not _is_unix_drive_prefix(p)
     )
 
     if is_unix_path:
         # For Unix paths, just normalize without converting to Windows format
+        # Without slash runs only a trailing slash can need removing
+        if "//" not in p:
+            return p.rstrip("/")
+
         # Replace double slashes with single slashes and remove trailing slashes
-        return re.sub(r"/+", "/", p).rstrip("/")
+        # by dropping the empty components between them
+        rest = "/".join(filter(None, p.split("/")))
+        return "/" + rest if rest else ""
+
+    # POSIX normpath leaves a non-empty path without forward slashes alone, so
+    # with no doubled backslashes and no lowercase drive letter we are done
+    if (
+        not _IS_WINDOWS
+        and p
+        and "/" not in p
+        and "\\\\" not in p
+        and not (p[1:2] == ":" and "a" <= p[0] <= "z")
+    ):
+        return p
 
     # Convert WSL or Unix-style Windows paths to Windows format
     p = convert_to_windows_path(p)
 
-    # Handle double backslashes, preserving leading UNC \\
-    if p.startswith("\\\\"):
-        # For UNC paths, handle excessive leading backslashes
-        # Count leading backslashes
+    # Collapse runs of backslashes, preserving leading UNC \\
+    if "\\\\" in p:
+        unc_prefix = ""
         leading_backslashes = 0
-        for char in p:
-            if char == "\\":
-                leading_backslashes += 1
-            else:
-                break
-
-        # Get the path after leading backslashes
-        path_after_leading = p[leading_backslashes:]
-
-        # Reconstruct with exactly 2 leading backslashes + normalized path
-        rest_normalized = path_after_leading.replace("\\\\", "\\")
-        p = "\\\\" + rest_normalized
+        if p.startswith("\\\\"):
+            # For UNC paths, collapse any excess leading backslashes to exactly 2
+            unc_prefix = "\\\\"
+            leading_backslashes = len(p) - len(p.lstrip("\\"))
+        p = unc_prefix + _BACKSLASH_RUN_RE.sub("\\\\", p[leading_backslashes:])
+
+        # normpath returns a UNC path unchanged on either platform when it has
+        # no dots, forward slashes or trailing separator, so stop here
+        if unc_prefix and "." not in p and "/" not in p and not p.endswith("\\"):
+            return p
+
+    # Use os.path.normpath for normalization, which handles . and .. segments.
+    # On POSIX it only looks at forward slashes, so it is a no-op on non-empty
+    # paths with none, or with no dots, slash runs or trailing slash either.
+    if (
+        not _IS_WINDOWS
+        and p
+        and ("/" not in p or ("." not in p and "//" not in p and p[-1] != "/"))
+    ):
+        normalized = p
     else:
-        # For non-UNC paths, normalize all double backslashes
-        p = p.replace("\\\\", "\\")
+        try:
+            normalized = os.path.normpath(p)
 
-    # Use os.path.normpath for normalization, which handles . and .. segments
-    try:
-        normalized = os.path.normpath(p)
+            # Fix UNC paths after normalization (normpath can affect UNC paths)
+            if p.startswith("\\\\") and not normalized.startswith("\\\\"):
+                normalized = "\\" + normalized
 
-        # Fix UNC paths after normalization (normpath can affect UNC paths)
-        if p.startswith("\\\\") and not normalized.startswith("\\\\"):
-            normalized = "\\" + normalized
+        except (OSError, ValueError):
+            # If normpath can't handle it, do basic normalization
+            normalized = p
 
-    except (OSError, ValueError):
-        # If normpath can't handle it, do basic normalization
-        normalized = p
-
-    # Handle Windows paths: convert slashes and ensure drive letter is capitalized
-    if re.match(r"^[a-zA-Z]:", normalized):
-        result = normalized.replace("/", "\\")
-        # Capitalize drive letter if present
-        if re.match(r"^[a-z]:", result):
-            result = result[0].upper() + result[1:]
-        return result
+    # Convert forward slashes to backslashes for all paths, including relative
+    # ones, so "some/relative/path" becomes "some\\relative\\path"
+    result = normalized.replace("/", "\\")
 
-    # For all other paths (including relative paths), convert forward slashes to backslashes
-    # This ensures relative paths like "some/relative/path" become "some\\relative\\path"
-    return normalized.replace("/", "\\")
+    # Capitalize the drive letter of Windows paths
+    if result[1:2] == ":" and "a" <= result[0] <= "z":
+        result = _ascii_upper(result[0]) + result[1:]
+    return result
 
 
+@functools.lru_cache(maxsize=4096)
 def expand_home(filepath: str) -> str:
     """
     Expands home directory tildes in paths.
 
+    The home directory is resolved once at import as _HOME_PREFIX; tests
+    that change it must also call expand_home.cache_clear().
+
     Args:
         filepath: The path to expand
 
     Returns:
         Expanded path
     """
-    if filepath.startswith("~/") or filepath == "~":
-        return os.path.join(os.path.expanduser("~"), filepath[1:].lstrip("/"))
+    if filepath == "~" or filepath.startswith("~/"):
+        return _HOME_PREFIX + filepath[1:].lstrip("/")
     return filepath
 
 
@@ -135,10 +196,10 @@ def normalize_path_cross_platform(p: str) -> str:
         Normalized path appropriate for the current OS
     """
     # Remove quotes and whitespace
-    p = p.strip().strip("\"'")
+    p = _strip_path(p)
 
     # On Windows, use our Windows-specific normalization
-    if os.name == "nt":
+    if _IS_WINDOWS:
         return normalize_path(p)
 
     # On Unix systems, use standard path normalization
@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 
+import asyncio
+import difflib
+import json
 import os
+import re
+import shutil
 import sys
 import tempfile
 from pathlib import Path
-from typing import Generator
+from typing import Generator, List
 from unittest.mock import patch
 
 import pytest
@@ -46,6 +51,42 @@ def allowed_directories(temp_directory: str) -> Generator[dict[str, str], None,
         }
 
 
+def apply_unified_diff(original: str, diff: str) -> str:
+    """Apply a diff from create_unified_diff as strictly as patch(1) does."""
+    original_lines = original.splitlines()
+    result: List[str] = []
+    position = 0
+    parts = re.split(r"^(@@ .* @@)\n", diff, flags=re.MULTILINE)[1:]
+    for header, body in zip(parts[::2], parts[1::2]):
+        match = re.match(r"@@ -(\d+)(?:,(\d+))? ", header)
+        assert match is not None
+        start, length = int(match.group(1)), int(match.group(2) or 1)
+        # An empty range names the line before it
+        if length:
+            start -= 1
+        hunk = body.splitlines()
+        assert original_lines[start : start + length] == [
+            line[1:] for line in hunk if not line.startswith("+")
+        ]
+
+        # Short context anchors a hunk to the start or end of the file
+        leading = next(
+            (i for i, line in enumerate(hunk) if not line.startswith(" ")), len(hunk)
+        )
+        trailing = next(
+            (i for i, line in enumerate(reversed(hunk)) if not line.startswith(" ")),
+            len(hunk),
+        )
+        assert leading >= 3 or start == 0
+        assert trailing >= 3 or start + length == len(original_lines)
+
+        result.extend(original_lines[position:start])
+        result.extend(line[1:] for line in hunk if not line.startswith("-"))
+        position = start + length
+    result.extend(original_lines[position:])
+    return "".join(f"{line}\n" for line in result)
+
+
 class TestPathValidation:
     """Test the path validation security function."""
 
@@ -82,6 +123,20 @@ class TestPathValidation:
         ):
             await validate_path(forbidden_path)
 
+    @pytest.mark.asyncio
+    async def test_rejects_sibling_directories_sharing_a_prefix(
+        self, allowed_directories: dict[str, str]
+    ) -> None:
+        """Directories that merely share a name prefix should be rejected."""
+        sibling_dir = allowed_directories["allowed1"] + "_extra"
+        os.makedirs(sibling_dir)
+        sibling_path = os.path.join(sibling_dir, "test.txt")
+
+        with pytest.raises(
+            ValueError, match="Access denied - path outside allowed directories"
+        ):
+            await validate_path(sibling_path)
+
     @pytest.mark.asyncio
     async def test_prevents_directory_traversal_attacks(
         self, allowed_directories: dict[str, str]
@@ -96,33 +151,30 @@ class TestPathValidation:
             os.path.join(allowed_dir, "subdir", "..", "..", "forbidden", "test.txt"),
         ]
 
-        for attempt in traversal_attempts:
-            with pytest.raises(ValueError, match="Access denied"):
-                await validate_path(attempt)
+        results = await asyncio.gather(
+            *(validate_path(attempt) for attempt in traversal_attempts),
+            return_exceptions=True,
+        )
+        for result in results:
+            assert isinstance(result, ValueError)
+            assert "Access denied" in str(result)
 
     @pytest.mark.asyncio
     async def test_handles_relative_paths_safely(
-        self, allowed_directories: dict[str, str]
+        self, allowed_directories: dict[str, str], monkeypatch: pytest.MonkeyPatch
     ) -> None:
         """Relative paths should be resolved safely."""
         allowed_dir = allowed_directories["allowed1"]
 
-        # Save current directory
-        original_cwd = os.getcwd()
-
-        try:
-            # Change to allowed directory
-            os.chdir(allowed_dir)
-
-            # Test relative path within allowed directory
-            relative_path = "test.txt"
-            result = await validate_path(relative_path)
-            expected = os.path.realpath(os.path.join(allowed_dir, relative_path))
-            assert result == expected
+        # Change to allowed directory; monkeypatch restores the original
+        # afterwards even if an assertion fails
+        monkeypatch.chdir(allowed_dir)
 
-        finally:
-            # Restore original directory
-            os.chdir(original_cwd)
+        # Test relative path within allowed directory
+        relative_path = "test.txt"
+        result = await validate_path(relative_path)
+        expected = os.path.realpath(os.path.join(allowed_dir, relative_path))
+        assert result == expected
 
     @pytest.mark.asyncio
     async def test_handles_symlinks_securely(
@@ -153,6 +205,82 @@ class TestPathValidation:
             # Skip test if symlinks not supported on this system
             pytest.skip("Symlinks not supported on this system")
 
+    @pytest.mark.asyncio
+    async def test_rejects_files_under_symlinked_directories(
+        self, allowed_directories: dict[str, str]
+    ) -> None:
+        """Regular files reached through a symlinked directory should be rejected."""
+        allowed_dir = allowed_directories["allowed1"]
+        forbidden_dir = allowed_directories["forbidden"]
+
+        # The file itself is not a symlink, but one of its ancestors is
+        Path(os.path.join(forbidden_dir, "secret.txt")).touch()
+        symlink_dir = os.path.join(allowed_dir, "link_to_forbidden")
+
+        try:
+            os.symlink(forbidden_dir, symlink_dir)
+
+            with pytest.raises(ValueError, match="Access denied"):
+                await validate_path(os.path.join(symlink_dir, "secret.txt"))
+
+        except OSError:
+            # Skip test if symlinks not supported on this system
+            pytest.skip("Symlinks not supported on this system")
+
+    @pytest.mark.asyncio
+    async def test_rechecks_directories_replaced_by_symlinks(
+        self, allowed_directories: dict[str, str]
+    ) -> None:
+        """A directory swapped for an outside symlink must not keep its verdict."""
+        allowed_dir = allowed_directories["allowed1"]
+        forbidden_dir = allowed_directories["forbidden"]
+        Path(os.path.join(forbidden_dir, "secret.txt")).touch()
+
+        sub_dir = os.path.join(allowed_dir, "sub")
+        os.makedirs(sub_dir)
+        Path(os.path.join(sub_dir, "a.txt")).touch()
+        await validate_path(os.path.join(sub_dir, "a.txt"))
+
+        # Replace the directory behind the server's back
+        shutil.rmtree(sub_dir)
+        try:
+            os.symlink(forbidden_dir, sub_dir)
+        except OSError:
+            # Skip test if symlinks not supported on this system
+            pytest.skip("Symlinks not supported on this system")
+
+        with pytest.raises(ValueError, match="Access denied"):
+            await validate_path(os.path.join(sub_dir, "secret.txt"))
+
+    @pytest.mark.asyncio
+    async def test_rechecks_retargeted_symlinks(
+        self, allowed_directories: dict[str, str]
+    ) -> None:
+        """A symlink pointed elsewhere must be validated against its new target."""
+        allowed_dir = allowed_directories["allowed1"]
+        forbidden_dir = allowed_directories["forbidden"]
+        target_file = os.path.join(allowed_dir, "target.txt")
+        forbidden_file = os.path.join(forbidden_dir, "secret.txt")
+        Path(target_file).touch()
+        Path(forbidden_file).touch()
+
+        symlink_path = os.path.join(allowed_dir, "link.txt")
+        try:
+            os.symlink(target_file, symlink_path)
+        except OSError:
+            # Skip test if symlinks not supported on this system
+            pytest.skip("Symlinks not supported on this system")
+        await validate_path(symlink_path)
+
+        os.unlink(symlink_path)
+        os.symlink(forbidden_file, symlink_path)
+
+        with pytest.raises(
+            ValueError,
+            match="Access denied - symlink target outside allowed directories",
+        ):
+            await validate_path(symlink_path)
+
     @pytest.mark.asyncio
     async def test_allows_symlinks_within_allowed_directories(
         self, allowed_directories: dict[str, str]
@@ -232,36 +360,38 @@ class TestPathValidation:
 class TestPathNormalizationSecurity:
     """Test path normalization for security issues."""
 
-    def test_removes_dangerous_path_components(self) -> None:
-        """Path normalization should handle dangerous components."""
-        dangerous_paths = [
+    @pytest.mark.parametrize(
+        "path",
+        [
             "../../../etc/passwd",
             "..\\..\\..\\windows\\system32",
             "./test/../../../etc/passwd",
             ".\\test\\..\\..\\..\\windows\\system32",
-        ]
-
-        for path in dangerous_paths:
-            normalized = normalize_path(path)
-            # After normalization, the path should not traverse outside
-            # This is a basic check - full security validation happens in validate_path
-            assert isinstance(normalized, str)
+        ],
+    )
+    def test_removes_dangerous_path_components(self, path: str) -> None:
+        """Path normalization should handle dangerous components."""
+        normalized = normalize_path(path)
+        # After normalization, the path should not traverse outside
+        # This is a basic check - full security validation happens in validate_path
+        assert isinstance(normalized, str)
 
-    def test_handles_unicode_and_special_characters(self) -> None:
-        """Unicode and special characters should be handled safely."""
-        special_paths = [
+    @pytest.mark.parametrize(
+        "path",
+        [
             "test/файл.txt",  # Cyrillic
             "test/文件.txt",  # Chinese
             "test/♥.txt",  # Unicode symbol
             "test/file with spaces.txt",
             "test/file&with&ampersands.txt",
             "test/file%20with%20encoding.txt",
-        ]
-
-        for path in special_paths:
-            normalized = normalize_path(path)
-            assert isinstance(normalized, str)
-            assert len(normalized) > 0
+        ],
+    )
+    def test_handles_unicode_and_special_characters(self, path: str) -> None:
+        """Unicode and special characters should be handled safely."""
+        normalized = normalize_path(path)
+        assert isinstance(normalized, str)
+        assert len(normalized) > 0
 
     def test_handles_very_long_paths(self) -> None:
         """Very long paths should be handled without errors."""
@@ -295,17 +425,204 @@ class TestExpandHome:
             # Normalize both paths for comparison
             assert os.path.normpath(result) == os.path.normpath(expected_path)
 
-    def test_does_not_expand_tilde_in_middle(self) -> None:
-        """Tilde in the middle of paths should not be expanded."""
-        paths_with_tilde = [
+    @pytest.mark.parametrize(
+        "path",
+        [
             "/path/with~tilde/file.txt",
             "path/with~tilde/file.txt",
             "/home/user~name/file.txt",
+        ],
+    )
+    def test_does_not_expand_tilde_in_middle(self, path: str) -> None:
+        """Tilde in the middle of paths should not be expanded."""
+        result = expand_home(path)
+        assert result == path  # Should be unchanged
+
+
+class TestDirectoryTree:
+    """Test the directory_tree tool."""
+
+    @pytest.mark.asyncio
+    async def test_stops_at_symlinks_to_ancestors(
+        self, allowed_directories: dict[str, str]
+    ) -> None:
+        """A symlink back to an ancestor should not be walked into forever."""
+        root = allowed_directories["allowed1"]
+        os.makedirs(os.path.join(root, "a"))
+        try:
+            os.symlink(root, os.path.join(root, "a", "up"))
+        except OSError:
+            # Skip test if symlinks not supported on this system
+            pytest.skip("Symlinks not supported on this system")
+
+        result = await asyncio.wait_for(
+            main.call_tool("directory_tree", {"path": root}), timeout=10
+        )
+
+        assert json.loads(result[0].text) == [
+            {
+                "name": "a",
+                "type": "directory",
+                "children": [{"name": "up", "type": "directory", "children": []}],
+            }
+        ]
+
+    @pytest.mark.asyncio
+    async def test_output_matches_json_dumps(
+        self, allowed_directories: dict[str, str]
+    ) -> None:
+        """The hand-built JSON should be exactly what json.dumps(indent=2) gives."""
+        root = allowed_directories["allowed1"]
+        os.makedirs(os.path.join(root, "outer", "inner", "empty"))
+        os.makedirs(os.path.join(root, "empty"))
+        for name in ('say "hi".txt', "naïve 文件.txt"):
+            Path(os.path.join(root, "outer", name)).touch()
+        Path(os.path.join(root, "outer", "inner", "ü.md")).touch()
+
+        result = await main.call_tool("directory_tree", {"path": root})
+        text = result[0].text
+        tree = json.loads(text)
+
+        assert text == json.dumps(tree, indent=2)
+
+        def by_name(entries: list[dict]) -> list[dict]:
+            # scandir order is arbitrary, so compare the entries sorted by name
+            return sorted(
+                (
+                    {**entry, "children": by_name(entry["children"])}
+                    if "children" in entry
+                    else entry
+                    for entry in entries
+                ),
+                key=lambda entry: entry["name"],
+            )
+
+        assert by_name(tree) == [
+            {"name": "empty", "type": "directory", "children": []},
+            {
+                "name": "outer",
+                "type": "directory",
+                "children": [
+                    {
+                        "name": "inner",
+                        "type": "directory",
+                        "children": [
+                            {"name": "empty", "type": "directory", "children": []},
+                            {"name": "ü.md", "type": "file"},
+                        ],
+                    },
+                    {"name": "naïve 文件.txt", "type": "file"},
+                    {"name": 'say "hi".txt', "type": "file"},
+                ],
+            },
         ]
 
-        for path in paths_with_tilde:
-            result = expand_home(path)
-            assert result == path  # Should be unchanged
+
+class TestSearchFiles:
+    """Test exclude patterns in search_files."""
+
+    @pytest.mark.asyncio
+    async def test_excluded_directory_name_prunes_its_subtree(
+        self, allowed_directories: dict[str, str]
+    ) -> None:
+        """A bare directory name should exclude everything below it."""
+        root = os.path.realpath(allowed_directories["allowed1"])
+        os.makedirs(os.path.join(root, "node_modules", "pkg"))
+        os.makedirs(os.path.join(root, "src"))
+        Path(os.path.join(root, "node_modules", "pkg", "match.py")).touch()
+        Path(os.path.join(root, "src", "match.py")).touch()
+
+        results = await main.search_files(root, "match", ["node_modules"])
+
+        assert results == [os.path.join(root, "src", "match.py")]
+
+    @pytest.mark.asyncio
+    async def test_excludes_files_matching_a_glob(
+        self, allowed_directories: dict[str, str]
+    ) -> None:
+        """A wildcard pattern should exclude the files it matches."""
+        root = os.path.realpath(allowed_directories["allowed1"])
+        Path(os.path.join(root, "app.log")).touch()
+        Path(os.path.join(root, "app.txt")).touch()
+
+        results = await main.search_files(root, "app", ["*.log"])
+
+        assert results == [os.path.join(root, "app.txt")]
+
+    @pytest.mark.asyncio
+    async def test_exclude_patterns_are_not_substrings(
+        self, allowed_directories: dict[str, str]
+    ) -> None:
+        """An exclude pattern should match whole names, not parts of them."""
+        root = os.path.realpath(allowed_directories["allowed1"])
+        Path(os.path.join(root, "test_a.py")).touch()
+
+        results = await main.search_files(root, "test_a", ["test"])
+
+        assert results == [os.path.join(root, "test_a.py")]
+
+
+class TestUnifiedDiff:
+    """Test diff output for file edits."""
+
+    @pytest.mark.parametrize(
+        ("original", "modified", "expected_hunk"),
+        [
+            ("a\nb\n", "a\nb", " a\n-b\n+b\n\\ No newline at end of file\n"),
+            ("a\nb", "a\nb\n", " a\n-b\n\\ No newline at end of file\n+b\n"),
+        ],
+    )
+    def test_reports_final_newline_changes(
+        self, original: str, modified: str, expected_hunk: str
+    ) -> None:
+        """Adding or removing only the final newline should still produce a diff."""
+        diff = main.create_unified_diff(original, modified)
+        assert diff.endswith("@@ -1,2 +1,2 @@\n" + expected_hunk)
+
+    @pytest.mark.parametrize(
+        ("original", "modified"),
+        [
+            (
+                "  a\n\n\tb\n\n  a\n\n\na\n\tb\nb\na\n\n\n\n\nb\nc\n",
+                "  a\n\n\tb\n\n  a\n\n\na\nb\na\n\n\n\nb\nc\n",
+            ),
+            (
+                "\n  a\na\n  a\n\nb\n\nb\n\n\tb\n\tb\nc\n\tb\n  a\n\n\n\n",
+                "\n  a\na\n\nb\n\n\tb\n\tb\nc\n\tb\n  a\n\n\n\n",
+            ),
+            (
+                "b\na\nb\n\tb\nc\n\tb\n\na\n\n\tb\na\nb\na\n  a\n",
+                "b\na\nb\n\tb\nc\na\n\n\tb\na\na\nb\na\n  a\n",
+            ),
+            ("x\n" * 10, "x\n" * 5 + "y\n" + "x\n" * 5),
+        ],
+    )
+    def test_hunks_keep_their_context(self, original: str, modified: str) -> None:
+        """Every hunk should carry its full context and apply to the original."""
+        diff = main.create_unified_diff(original, modified)
+        assert apply_unified_diff(original, diff) == modified
+
+    def test_hunk_headers_use_file_line_numbers(self) -> None:
+        """Hunks deep in a file should be numbered from the start of the file."""
+        original_lines = [f"line{i}" for i in range(100)]
+        modified_lines = list(original_lines)
+        modified_lines[49] = "changed"
+        modified_lines[80:82] = []
+        original = "".join(f"{line}\n" for line in original_lines)
+        modified = "".join(f"{line}\n" for line in modified_lines)
+
+        diff = main.create_unified_diff(original, modified)
+
+        expected = difflib.unified_diff(
+            original_lines,
+            modified_lines,
+            fromfile="file (original)",
+            tofile="file (modified)",
+            lineterm="",
+        )
+        assert diff == "".join(f"{line}\n" for line in expected)
+        assert "@@ -47,7 +47,7 @@" in diff
+        assert "@@ -78,8 +78,6 @@" in diff
 
 
 if __name__ == "__main__":
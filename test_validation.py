@@ -1,111 +1,119 @@
 #!/usr/bin/env python3
 
+import functools
 import os
+import shutil
+import stat
 import tempfile
-from pathlib import Path
 from typing import Dict, Generator, List, Union
-from unittest.mock import patch
 
 import pytest
 
+import path_utils
 from path_utils import expand_home, normalize_path
 
 # Type alias for test directory fixture
 TestDirectories = Dict[str, Union[str, List[str]]]
 
 
-async def validate_path_with_allowed(
-    requested_path: str, allowed_dirs: list[str]
-) -> str:
+class AllowedPrefixMatcher:
+    """Match normalized paths against a set of allowed directory prefixes."""
+
+    def __init__(self, normalized_dirs: tuple[str, ...], allowed_str: str) -> None:
+        # Preformatted directory list for access-denied messages
+        self.allowed_str = allowed_str
+        self.prefixes = tuple(normalized_dirs)
+
+    def matches(self, path: str) -> bool:
+        """Check whether path lies within one of the allowed prefixes."""
+        path = path.rstrip(os.sep) + os.sep
+        return path.startswith(self.prefixes)
+
+
+@functools.cache
+def allowed_matcher(allowed_dirs: tuple[str, ...]) -> AllowedPrefixMatcher:
+    """Resolve and normalize allowed directories once per distinct set.
+
+    Each prefix ends in a separator so that /foo does not match /foobar.
+    """
+    return AllowedPrefixMatcher(
+        tuple(
+            normalize_path(os.path.realpath(dir_path)).rstrip(os.sep) + os.sep
+            for dir_path in allowed_dirs
+        ),
+        ", ".join(allowed_dirs),
+    )
+
+
+def validate_path_with_allowed(requested_path: str, allowed_dirs: list[str]) -> str:
     """Test version of validate_path that takes allowed directories as parameter."""
     expanded_path = expand_home(requested_path)
     absolute = os.path.abspath(expanded_path)
-    normalized_requested = normalize_path(absolute)
 
     # Normalize allowed directories to their real paths for consistent comparison
-    normalized_allowed_dirs = [
-        normalize_path(os.path.realpath(dir_path)) for dir_path in allowed_dirs
-    ]
+    matcher = allowed_matcher(tuple(allowed_dirs))
 
-    # Check if path is within allowed directories (use real path for comparison)
+    # Resolve the real path once; it covers both a symlinked leaf and
+    # symlinked ancestors, so one allowed-directory check suffices
     try:
-        real_requested_path = os.path.realpath(absolute)
-        normalized_real_requested = normalize_path(real_requested_path)
+        st: os.stat_result | None = os.lstat(absolute)
     except OSError:
-        # If we can't get the real path, use the normalized absolute path
-        normalized_real_requested = normalized_requested
+        # realpath treats anything it cannot lstat as a plain component too
+        st = None
+    is_symlink = st is not None and stat.S_ISLNK(st.st_mode)
+    if is_symlink:
+        real_path = os.path.realpath(absolute)
+    else:
+        # The leaf is not a link, so only its parent needs resolving
+        real_path = os.path.join(
+            os.path.realpath(os.path.dirname(absolute)), os.path.basename(absolute)
+        )
 
-    is_allowed = any(
-        normalized_real_requested.startswith(dir_path)
-        for dir_path in normalized_allowed_dirs
-    )
-    if not is_allowed:
+    if not matcher.matches(normalize_path(real_path)):
         raise ValueError(
-            f"Access denied - path outside allowed directories: {absolute} not in {', '.join(allowed_dirs)}"
+            f"Access denied - path outside allowed directories: {absolute} not in {matcher.allowed_str}"
         )
 
-    # For nonexistent files, check that the parent directory exists
-    if not os.path.exists(absolute):
+    # For nonexistent files, check that the parent directory exists. The lstat
+    # above already answers this unless the path is a possibly dangling link.
+    if st is None or (is_symlink and not os.path.exists(absolute)):
         parent_dir = os.path.dirname(absolute)
         if not os.path.exists(parent_dir):
             raise ValueError(f"Parent directory does not exist: {parent_dir}")
 
-    # Handle symlinks by checking their real path
-    try:
-        real_path = os.path.realpath(absolute)
-        normalized_real = normalize_path(real_path)
-        is_real_path_allowed = any(
-            normalized_real.startswith(dir_path) for dir_path in normalized_allowed_dirs
-        )
-        if not is_real_path_allowed:
-            raise ValueError(
-                "Access denied - symlink target outside allowed directories"
-            )
-        return real_path
-    except OSError:
-        # For new files that don't exist yet, verify parent directory
-        parent_dir = os.path.dirname(absolute)
+    return real_path
 
-        # Check if parent directory actually exists
-        if not os.path.exists(parent_dir):
-            raise ValueError(f"Parent directory does not exist: {parent_dir}")
 
-        try:
-            real_parent_path = os.path.realpath(parent_dir)
-            normalized_parent = normalize_path(real_parent_path)
-            is_parent_allowed = any(
-                normalized_parent.startswith(dir_path)
-                for dir_path in normalized_allowed_dirs
-            )
-            if not is_parent_allowed:
-                raise ValueError(
-                    "Access denied - parent directory outside allowed directories"
-                )
-            return absolute
-        except OSError:
-            raise ValueError(f"Parent directory does not exist: {parent_dir}")
+def create_empty_file(path: str) -> None:
+    """Create an empty file with a bare open/close."""
+    os.close(os.open(path, os.O_WRONLY | os.O_CREAT, 0o644))
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def temp_directory() -> Generator[str, None, None]:
-    """Create a temporary directory for testing."""
+    """Create a temporary directory shared by the whole test session."""
     with tempfile.TemporaryDirectory() as tmpdir:
         yield tmpdir
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def test_directories(temp_directory: str) -> TestDirectories:
     """Set up test directories."""
     allowed_dir1 = os.path.join(temp_directory, "allowed1")
     allowed_dir2 = os.path.join(temp_directory, "allowed2")
     forbidden_dir = os.path.join(temp_directory, "forbidden")
 
-    os.makedirs(allowed_dir1, exist_ok=True)
-    os.makedirs(allowed_dir2, exist_ok=True)
-    os.makedirs(forbidden_dir, exist_ok=True)
+    os.mkdir(allowed_dir1)
+    os.mkdir(allowed_dir2)
+    os.mkdir(forbidden_dir)
+
+    # Resolve the allowed directories now, during setup, rather than on the
+    # first validation; every later call reuses the cached matcher
+    allowed_dirs = [allowed_dir1, allowed_dir2]
+    allowed_matcher(tuple(allowed_dirs))
 
     return {
-        "allowed_dirs": [allowed_dir1, allowed_dir2],
+        "allowed_dirs": allowed_dirs,
         "allowed1": allowed_dir1,
         "allowed2": allowed_dir2,
         "forbidden": forbidden_dir,
@@ -113,10 +121,42 @@ def test_directories(temp_directory: str) -> TestDirectories:
     }
 
 
+@pytest.fixture(autouse=True)
+def clean_test_directories(
+    test_directories: TestDirectories,
+) -> Generator[None, None, None]:
+    """Remove whatever a test created so the shared directories start empty."""
+    yield
+    for key in ("allowed1", "allowed2", "forbidden"):
+        directory = test_directories[key]
+        assert isinstance(directory, str)
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.unlink(entry.path)
+
+
+@pytest.fixture
+def home_in_allowed_dir(
+    test_directories: TestDirectories, monkeypatch: pytest.MonkeyPatch
+) -> Generator[str, None, None]:
+    """Point the home directory at allowed1, keeping expand_home's cache clean."""
+    allowed_dir = test_directories["allowed1"]
+    assert isinstance(allowed_dir, str)
+
+    # expand_home caches by path, so drop entries made under either home
+    expand_home.cache_clear()
+    monkeypatch.setattr(path_utils, "_HOME_PREFIX", allowed_dir + os.sep)
+    yield allowed_dir
+    expand_home.cache_clear()
+
+
 class TestPathValidationCore:
     """Test the core path validation functionality."""
 
-    async def test_allows_valid_paths_in_allowed_directories(
+    def test_allows_valid_paths_in_allowed_directories(
         self, test_directories: TestDirectories
     ) -> None:
         """Valid paths within allowed directories should be accepted."""
@@ -127,17 +167,17 @@ class TestPathValidationCore:
 
         # Test direct path
         valid_path = os.path.join(allowed_dir, "test.txt")
-        result = await validate_path_with_allowed(valid_path, allowed_dirs)
+        result = validate_path_with_allowed(valid_path, allowed_dirs)
         assert result == os.path.realpath(valid_path)
 
         # Test subdirectory path
         subdir_path = os.path.join(allowed_dir, "subdir", "test.txt")
-        os.makedirs(os.path.dirname(subdir_path), exist_ok=True)
-        Path(subdir_path).touch()
-        result = await validate_path_with_allowed(subdir_path, allowed_dirs)
+        os.mkdir(os.path.dirname(subdir_path))
+        create_empty_file(subdir_path)
+        result = validate_path_with_allowed(subdir_path, allowed_dirs)
         assert result == os.path.realpath(subdir_path)
 
-    async def test_rejects_paths_outside_allowed_directories(
+    def test_rejects_paths_outside_allowed_directories(
         self, test_directories: TestDirectories
     ) -> None:
         """Paths outside allowed directories should be rejected."""
@@ -150,30 +190,47 @@ class TestPathValidationCore:
         with pytest.raises(
             ValueError, match="Access denied - path outside allowed directories"
         ):
-            await validate_path_with_allowed(forbidden_path, allowed_dirs)
+            validate_path_with_allowed(forbidden_path, allowed_dirs)
 
-    async def test_prevents_directory_traversal_attacks(
+    def test_rejects_sibling_directories_sharing_a_prefix(
         self, test_directories: TestDirectories
     ) -> None:
-        """Directory traversal attacks should be prevented."""
+        """Directories that merely share a name prefix should be rejected."""
         allowed_dirs = test_directories["allowed_dirs"]
         assert isinstance(allowed_dirs, list)
         allowed_dir = test_directories["allowed1"]
         assert isinstance(allowed_dir, str)
+        sibling_path = os.path.join(allowed_dir + "_extra", "test.txt")
 
-        # Test various traversal attempts
-        traversal_attempts = [
-            os.path.join(allowed_dir, "..", "forbidden", "test.txt"),
-            os.path.join(allowed_dir, "..", "..", "etc", "passwd"),
-            os.path.join(allowed_dir, "subdir", "..", "..", "forbidden", "test.txt"),
-        ]
+        with pytest.raises(
+            ValueError, match="Access denied - path outside allowed directories"
+        ):
+            validate_path_with_allowed(sibling_path, allowed_dirs)
+
+    @pytest.mark.parametrize(
+        "attempt_parts",
+        [
+            ("..", "forbidden", "test.txt"),
+            ("..", "..", "etc", "passwd"),
+            ("subdir", "..", "..", "forbidden", "test.txt"),
+        ],
+    )
+    def test_prevents_directory_traversal_attacks(
+        self, test_directories: TestDirectories, attempt_parts: tuple[str, ...]
+    ) -> None:
+        """Directory traversal attacks should be prevented."""
+        allowed_dirs = test_directories["allowed_dirs"]
+        assert isinstance(allowed_dirs, list)
+        allowed_dir = test_directories["allowed1"]
+        assert isinstance(allowed_dir, str)
 
-        for attempt in traversal_attempts:
-            with pytest.raises(ValueError, match="Access denied"):
-                await validate_path_with_allowed(attempt, allowed_dirs)
+        # Test a traversal attempt starting inside the allowed directory
+        attempt = os.path.join(allowed_dir, *attempt_parts)
+        with pytest.raises(ValueError, match="Access denied"):
+            validate_path_with_allowed(attempt, allowed_dirs)
 
-    async def test_handles_relative_paths_safely(
-        self, test_directories: TestDirectories
+    def test_handles_relative_paths_safely(
+        self, test_directories: TestDirectories, monkeypatch: pytest.MonkeyPatch
     ) -> None:
         """Relative paths should be resolved safely."""
         allowed_dirs = test_directories["allowed_dirs"]
@@ -181,26 +238,17 @@ class TestPathValidationCore:
         allowed_dir = test_directories["allowed1"]
         assert isinstance(allowed_dir, str)
 
-        # Save current directory
-        original_cwd = os.getcwd()
-
-        try:
-            # Change to allowed directory
-            os.chdir(allowed_dir)
+        # Change to allowed directory; monkeypatch restores the original
+        # afterwards even if an assertion fails
+        monkeypatch.chdir(allowed_dir)
 
-            # Test relative path within allowed directory
-            relative_path = "test.txt"
-            result = await validate_path_with_allowed(relative_path, allowed_dirs)
-            expected = os.path.realpath(os.path.join(allowed_dir, relative_path))
-            assert result == expected
+        # Test relative path within allowed directory
+        relative_path = "test.txt"
+        result = validate_path_with_allowed(relative_path, allowed_dirs)
+        expected = os.path.realpath(os.path.join(allowed_dir, relative_path))
+        assert result == expected
 
-        finally:
-            # Restore original directory
-            os.chdir(original_cwd)
-
-    async def test_handles_symlinks_securely(
-        self, test_directories: TestDirectories
-    ) -> None:
+    def test_handles_symlinks_securely(self, test_directories: TestDirectories) -> None:
         """Symlinks should be validated against their target paths."""
         allowed_dirs = test_directories["allowed_dirs"]
         assert isinstance(allowed_dirs, list)
@@ -211,7 +259,7 @@ class TestPathValidationCore:
 
         # Create a target file in forbidden directory
         forbidden_file = os.path.join(forbidden_dir, "secret.txt")
-        Path(forbidden_file).touch()
+        create_empty_file(forbidden_file)
 
         # Create symlink in allowed directory pointing to forbidden file
         symlink_path = os.path.join(allowed_dir, "link_to_secret.txt")
@@ -221,13 +269,13 @@ class TestPathValidationCore:
 
             # Should reject the symlink because target is outside allowed directories
             with pytest.raises(ValueError, match="Access denied"):
-                await validate_path_with_allowed(symlink_path, allowed_dirs)
+                validate_path_with_allowed(symlink_path, allowed_dirs)
 
         except OSError:
             # Skip test if symlinks not supported on this system
             pytest.skip("Symlinks not supported on this system")
 
-    async def test_allows_symlinks_within_allowed_directories(
+    def test_allows_symlinks_within_allowed_directories(
         self, test_directories: TestDirectories
     ) -> None:
         """Symlinks within allowed directories should be accepted."""
@@ -238,7 +286,7 @@ class TestPathValidationCore:
 
         # Create target file in allowed directory
         target_file = os.path.join(allowed_dir, "target.txt")
-        Path(target_file).touch()
+        create_empty_file(target_file)
 
         # Create symlink in allowed directory pointing to allowed file
         symlink_path = os.path.join(allowed_dir, "link_to_target.txt")
@@ -247,14 +295,14 @@ class TestPathValidationCore:
             os.symlink(target_file, symlink_path)
 
             # Should accept the symlink because target is within allowed directories
-            result = await validate_path_with_allowed(symlink_path, allowed_dirs)
+            result = validate_path_with_allowed(symlink_path, allowed_dirs)
             assert result == os.path.realpath(symlink_path)
 
         except OSError:
             # Skip test if symlinks not supported on this system
             pytest.skip("Symlinks not supported on this system")
 
-    async def test_handles_nonexistent_files_safely(
+    def test_handles_nonexistent_files_safely(
         self, test_directories: TestDirectories
     ) -> None:
         """Nonexistent files should validate their parent directory."""
@@ -265,7 +313,7 @@ class TestPathValidationCore:
 
         # Test nonexistent file in allowed directory
         nonexistent_path = os.path.join(allowed_dir, "nonexistent.txt")
-        result = await validate_path_with_allowed(nonexistent_path, allowed_dirs)
+        result = validate_path_with_allowed(nonexistent_path, allowed_dirs)
         # The result might be the real path version due to symlink resolution
         assert (
             nonexistent_path in result or os.path.basename(result) == "nonexistent.txt"
@@ -277,9 +325,9 @@ class TestPathValidationCore:
         forbidden_nonexistent = os.path.join(forbidden_dir, "nonexistent.txt")
 
         with pytest.raises(ValueError, match="Access denied"):
-            await validate_path_with_allowed(forbidden_nonexistent, allowed_dirs)
+            validate_path_with_allowed(forbidden_nonexistent, allowed_dirs)
 
-    async def test_handles_nonexistent_parent_directory(
+    def test_handles_nonexistent_parent_directory(
         self, test_directories: TestDirectories
     ) -> None:
         """Files with nonexistent parent directories should be rejected."""
@@ -294,24 +342,20 @@ class TestPathValidationCore:
         )
 
         with pytest.raises(ValueError, match="Parent directory does not exist"):
-            await validate_path_with_allowed(nonexistent_parent_path, allowed_dirs)
+            validate_path_with_allowed(nonexistent_parent_path, allowed_dirs)
 
-    async def test_expands_home_directory_correctly(
-        self, test_directories: TestDirectories
+    def test_expands_home_directory_correctly(
+        self, test_directories: TestDirectories, home_in_allowed_dir: str
     ) -> None:
         """Home directory expansion should work correctly."""
         allowed_dirs = test_directories["allowed_dirs"]
         assert isinstance(allowed_dirs, list)
-        allowed_dir = test_directories["allowed1"]
-        assert isinstance(allowed_dir, str)
 
-        # Mock home directory to be within our allowed directories
-        with patch("os.path.expanduser", return_value=allowed_dir):
-            # Test tilde expansion
-            tilde_path = "~/test.txt"
-            result = await validate_path_with_allowed(tilde_path, allowed_dirs)
-            expected = os.path.realpath(os.path.join(allowed_dir, "test.txt"))
-            assert result == expected
+        # Test tilde expansion
+        tilde_path = "~/test.txt"
+        result = validate_path_with_allowed(tilde_path, allowed_dirs)
+        expected = os.path.realpath(os.path.join(home_in_allowed_dir, "test.txt"))
+        assert result == expected
 
 
 if __name__ == "__main__":